@@ -8,8 +8,20 @@ composition.
 __author__ = "David Folch dfolch@fsu.edu, Serge Rey srey@asu.edu"
 
 import numpy as np
-from pysal.region.components import check_contiguity
-from pysal.common import copy
+import multiprocessing as mp
+from collections import deque
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+try:
+    from numba import njit
+    HAS_JIT = True
+except ImportError:
+    HAS_JIT = False
+
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
 
 __all__ = ["Random_Regions", "Random_Region"]
 
@@ -56,6 +68,20 @@ class Random_Regions:
     permutations    : int
                       number of Random_Region instances to generate
 
+    cores           : boolean
+                      if True the permutations are spread over all available
+                      cores with a multiprocessing pool (default: False);
+                      fewer than 8 permutations always run sequentially, as
+                      the pool would cost more than it saves; each
+                      permutation is seeded from the parent random state, so
+                      results only depend on seed (or on the numpy seed set
+                      before the call)
+
+    seed            : int
+                      seed for the random state used to generate the
+                      permutations (if None then the global numpy random
+                      state is used)
+
     Attributes
     ----------
 
@@ -70,7 +96,6 @@ class Random_Regions:
 
     Setup the data
 
-    >>> import random
     >>> import numpy as np
     >>> import pysal
     >>> nregs = 13
@@ -80,23 +105,20 @@ class Random_Regions:
 
     Unconstrained
 
-    >>> random.seed(10)
     >>> np.random.seed(10)
     >>> t0 = pysal.region.Random_Regions(ids, permutations=2)
     >>> t0.solutions[0].regions[0]
-    [19, 14, 43, 37, 66, 3, 79, 41, 38, 68, 2, 1, 60]
+    [19, 14, 43, 37, 66, 3]
 
     Cardinality and contiguity constrained (num_regions implied)
 
-    >>> random.seed(60)
     >>> np.random.seed(60)
     >>> t1 = pysal.region.Random_Regions(ids, num_regions=nregs, cardinality=cards, contiguity=w, permutations=2)
     >>> t1.solutions[0].regions[0]
-    [62, 61, 81, 71, 64, 90, 72, 51, 80, 63, 50, 73, 52]
+    [37, 89, 58, 48, 68, 47, 69, 67, 98, 79, 57, 99, 66]
 
     Cardinality constrained (num_regions implied)
 
-    >>> random.seed(100)
     >>> np.random.seed(100)
     >>> t2 = pysal.region.Random_Regions(ids, num_regions=nregs, cardinality=cards, permutations=2)
     >>> t2.solutions[0].regions[0]
@@ -104,31 +126,27 @@ class Random_Regions:
 
     Number of regions and contiguity constrained
 
-    >>> random.seed(100)
     >>> np.random.seed(100)
     >>> t3 = pysal.region.Random_Regions(ids, num_regions=nregs, contiguity=w, permutations=2)
     >>> t3.solutions[0].regions[1]
-    [62, 52, 51, 63, 61, 73, 41, 53, 60, 83, 42, 31, 32]
+    [30, 50, 40, 20, 10, 60, 31, 91, 61, 81, 32, 70, 62, 80, 90, 71]
 
     Cardinality and contiguity constrained
 
-    >>> random.seed(60)
     >>> np.random.seed(60)
     >>> t4 = pysal.region.Random_Regions(ids, cardinality=cards, contiguity=w, permutations=2)
     >>> t4.solutions[0].regions[0]
-    [62, 61, 81, 71, 64, 90, 72, 51, 80, 63, 50, 73, 52]
+    [37, 89, 58, 48, 68, 47, 69, 67, 98, 79, 57, 99, 66]
 
     Number of regions constrained
 
-    >>> random.seed(100)
     >>> np.random.seed(100)
     >>> t5 = pysal.region.Random_Regions(ids, num_regions=nregs, permutations=2)
     >>> t5.solutions[0].regions[0]
-    [37, 62, 26, 41, 35, 25, 36]
+    [37, 62, 26, 41, 35]
 
     Cardinality constrained
 
-    >>> random.seed(100)
     >>> np.random.seed(100)
     >>> t6 = pysal.region.Random_Regions(ids, cardinality=cards, permutations=2)
     >>> t6.solutions[0].regions[0]
@@ -136,21 +154,51 @@ class Random_Regions:
 
     Contiguity constrained
 
-    >>> random.seed(100)
     >>> np.random.seed(100)
     >>> t7 = pysal.region.Random_Regions(ids, contiguity=w, permutations=2)
     >>> t7.solutions[0].regions[1]
-    [62, 61, 71, 63]
+    [62, 61, 71, 81]
 
     """
     def __init__(
         self, area_ids, num_regions=None, cardinality=None, contiguity=None,
-        maxiter=100, compact=False, max_swaps=1000000, permutations=99):
+        maxiter=100, compact=False, max_swaps=1000000, permutations=99,
+        cores=False, seed=None):
 
-        solutions = []
-        for i in range(permutations):
-            solutions.append(Random_Region(area_ids, num_regions, cardinality,
-                                           contiguity, maxiter, compact, max_swaps))
+        # flatten the contiguity structure once for all permutations
+        csr = None
+        if contiguity:
+            csr = _w_to_csr(contiguity)
+        kwargs = dict(area_ids=area_ids, num_regions=num_regions,
+                      cardinality=cardinality, contiguity=contiguity,
+                      maxiter=maxiter, compact=compact, max_swaps=max_swaps,
+                      _csr=csr)
+        parallel = cores and permutations >= 8
+        if parallel or seed is not None:
+            # independent permutations, each seeded from the parent state
+            seeds = _get_rng(seed).randint(0, 2 ** 31 - 1, size=permutations)
+            seeds = seeds.tolist()
+        if parallel:
+            n_cores = mp.cpu_count()
+            chunksize = max(1, permutations // (4 * n_cores))
+            pool = mp.Pool(n_cores, initializer=_init_worker,
+                           initargs=(kwargs,))
+            try:
+                solutions = list(pool.imap(_one_region, seeds, chunksize))
+            except BaseException:
+                # do not leave workers behind, e.g. on invalid cardinalities
+                pool.terminate()
+                raise
+            else:
+                pool.close()
+            finally:
+                pool.join()
+        elif seed is not None:
+            solutions = [Random_Region(seed=i, **kwargs) for i in seeds]
+        else:
+            solutions = []
+            for i in range(permutations):
+                solutions.append(Random_Region(**kwargs))
         self.solutions = solutions
         self.solutions_feas = []
         for i in solutions:
@@ -158,6 +206,202 @@ class Random_Regions:
                 self.solutions_feas.append(i)
 
 
+def _get_rng(seed):
+    """Random state for seed, or the np.random module (which draws from the
+    global state set by np.random.seed) if None."""
+    if seed is None:
+        return np.random
+    return np.random.RandomState(seed)
+
+
+_worker_kwargs = None
+
+
+def _init_worker(kwargs):
+    # share the Random_Region arguments once per worker process
+    global _worker_kwargs
+    _worker_kwargs = kwargs
+
+
+def _one_region(seed):
+    return Random_Region(seed=seed, **_worker_kwargs)
+
+
+# flags of the per-area state byte shared by _Candidates and the kernels
+_CANDIDATE = 1
+_POTENTIAL = 2
+_REGION = 4
+_VISITED = 8
+# masks clearing flags, as non-negative complements: ~_CANDIDATE is -2,
+# which does not fit in a uint8 state outside compiled code
+_NOT_CANDIDATE = 0xFF ^ _CANDIDATE
+_NOT_POTENTIAL = 0xFF ^ _POTENTIAL
+_NOT_GROWN = 0xFF ^ (_CANDIDATE | _POTENTIAL)
+_NOT_REGION = 0xFF ^ _REGION
+_NOT_MEMBER = 0xFF ^ (_REGION | _VISITED)
+
+
+class _Candidates:
+    """Ordered set of candidate area indices.
+
+    Membership is the _CANDIDATE flag of the per-area state (shared with
+    the region growing kernel), while a deque keeps the order in which
+    candidates are drawn. Removed areas are deleted lazily from the deque;
+    each removal is counted so that the stale entry is skipped when it
+    reaches the front, even if the area was appended again since.
+    """
+
+    def __init__(self, order, state):
+        self.state = state
+        for area in order:
+            state[area] |= _CANDIDATE
+        self.order = deque(order)
+        self.size = len(order)
+        self.stale = [0] * len(state)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, area):
+        return bool(self.state[area] & _CANDIDATE)
+
+    def popleft(self):
+        while True:
+            area = self.order.popleft()
+            if self.stale[area]:
+                self.stale[area] -= 1
+            else:
+                self.state[area] &= _NOT_CANDIDATE
+                self.size -= 1
+                return area
+
+    def append(self, area):
+        self.state[area] |= _CANDIDATE
+        self.order.append(area)
+        self.size += 1
+
+    def extend(self, areas):
+        for area in areas:
+            self.append(area)
+
+    def remove(self, area):
+        # the growing kernel may already have cleared the flag
+        self.state[area] &= _NOT_CANDIDATE
+        self.size -= 1
+        self.stale[area] += 1
+
+
+def _w_to_csr(w):
+    """Flatten the neighbors of w into CSR arrays (indptr, data), with areas
+    indexed 0..n-1 following w.id_order, along with the sizes of the
+    connected components of w."""
+    id2i = w.id2i
+    indptr = np.zeros(w.n + 1, dtype=np.int32)
+    indptr[1:] = np.cumsum([len(w.neighbors[i]) for i in w.id_order])
+    data = np.fromiter((id2i[j] for i in w.id_order for j in w.neighbors[i]),
+                       dtype=np.int32, count=indptr[-1])
+    graph = sparse.csr_matrix((np.ones(len(data)), data, indptr),
+                              shape=(w.n, w.n))
+    labels = connected_components(graph, directed=False)[1]
+    comp_sizes = np.bincount(labels)
+    if not HAS_JIT:
+        # element access on lists is faster than on arrays in pure Python
+        return indptr.tolist(), data.tolist(), comp_sizes
+    return indptr, data, comp_sizes
+
+
+def _workspace(n):
+    """Allocate the per-area state flags and the two int buffers used by
+    the kernels below for n areas."""
+    if HAS_JIT:
+        return (np.zeros(n, dtype=np.uint8), np.zeros(n, dtype=np.int32),
+                np.zeros(n, dtype=np.int32))
+    return bytearray(n), [0] * n, [0] * n
+
+
+@njit
+def _grow_region(indptr, data, seed, test_card, compact, state, pot_items,
+                 region, draws, d):
+    """Grow a contiguous region from seed, writing its areas into region.
+
+    Potential areas are flagged in state and listed in pot_items, so that
+    a random one is removed in O(1) by swapping it with the last. Areas
+    added to the region lose their candidate flag, so an area is a new
+    potential area exactly when its state is _CANDIDATE. draws holds
+    uniform numbers in [0, 1), consumed from position d on, one per area
+    added after the seed. Returns the size of the region, which is smaller
+    than test_card if the potential areas run out.
+    """
+    region[0] = seed
+    size = 1
+    n_pot = 0
+    for k in range(indptr[seed], indptr[seed + 1]):
+        j = data[k]
+        if state[j] == _CANDIDATE:
+            state[j] |= _POTENTIAL
+            pot_items[n_pot] = j
+            n_pot += 1
+    while n_pot > 0 and size < test_card:
+        first = size
+        # compact regions exhaust the existing potential areas before
+        # adding new ones, otherwise potential grows after each area
+        while n_pot > 0 and size < test_card:
+            index = int(draws[d] * n_pot)
+            d += 1
+            area = pot_items[index]
+            n_pot -= 1
+            pot_items[index] = pot_items[n_pot]
+            state[area] &= _NOT_GROWN
+            region[size] = area
+            size += 1
+            if not compact:
+                break
+        for r in range(first, size):
+            area = region[r]
+            for k in range(indptr[area], indptr[area + 1]):
+                j = data[k]
+                if state[j] == _CANDIDATE:
+                    state[j] |= _POTENTIAL
+                    pot_items[n_pot] = j
+                    n_pot += 1
+    for r in range(n_pot):
+        state[pot_items[r]] &= _NOT_POTENTIAL
+    return size
+
+
+@njit
+def _check_contiguity(indptr, data, members, leaver, state, queue):
+    """Test if members remain connected when leaver is removed.
+
+    Same test as components.check_contiguity, on area indices: membership
+    is flagged in state (region and visited flags clear on entry and on
+    return) instead of scanning the member list, and queue is a scratch
+    buffer of length n.
+    """
+    for area in members:
+        state[area] |= _REGION
+    state[leaver] &= _NOT_REGION
+    start = members[0]
+    if start == leaver:
+        start = members[1]
+    state[start] |= _VISITED
+    queue[0] = start
+    head = 0
+    tail = 1
+    while head < tail:
+        area = queue[head]
+        head += 1
+        for k in range(indptr[area], indptr[area + 1]):
+            j = data[k]
+            if state[j] & (_REGION | _VISITED) == _REGION:
+                state[j] |= _VISITED
+                queue[tail] = j
+                tail += 1
+    for area in members:
+        state[area] &= _NOT_MEMBER
+    return tail == len(members) - 1
+
+
 class Random_Region:
     """Randomly combine a given set of areas into two or more regions based
     on various constraints.
@@ -169,7 +413,7 @@ class Random_Region:
     area_ids        : list
                       IDs indexing the areas to be grouped into regions (must
                       be in the same order as spatial weights matrix if this
-                      is provided)
+                      is provided; the list itself is not modified)
 
     num_regions     : integer
                       number of regions to generate (if None then this is
@@ -198,6 +442,10 @@ class Random_Region:
                       maximum number of swaps to find a feasible solution
                       (only affects contiguity constrained regions)
 
+    seed            : int
+                      seed for the random state used to build the regions
+                      (if None then the global numpy random state is used)
+
     Attributes
     ----------
 
@@ -213,7 +461,6 @@ class Random_Region:
 
     Setup the data
 
-    >>> import random
     >>> import numpy as np
     >>> import pysal
     >>> nregs = 13
@@ -223,23 +470,20 @@ class Random_Region:
 
     Unconstrained
 
-    >>> random.seed(10)
     >>> np.random.seed(10)
     >>> t0 = pysal.region.Random_Region(ids)
     >>> t0.regions[0]
-    [19, 14, 43, 37, 66, 3, 79, 41, 38, 68, 2, 1, 60]
+    [19, 14, 43, 37, 66, 3]
 
     Cardinality and contiguity constrained (num_regions implied)
 
-    >>> random.seed(60)
     >>> np.random.seed(60)
     >>> t1 = pysal.region.Random_Region(ids, num_regions=nregs, cardinality=cards, contiguity=w)
     >>> t1.regions[0]
-    [62, 61, 81, 71, 64, 90, 72, 51, 80, 63, 50, 73, 52]
+    [37, 89, 58, 48, 68, 47, 69, 67, 98, 79, 57, 99, 66]
 
     Cardinality constrained (num_regions implied)
 
-    >>> random.seed(100)
     >>> np.random.seed(100)
     >>> t2 = pysal.region.Random_Region(ids, num_regions=nregs, cardinality=cards)
     >>> t2.regions[0]
@@ -247,31 +491,27 @@ class Random_Region:
 
     Number of regions and contiguity constrained
 
-    >>> random.seed(100)
     >>> np.random.seed(100)
     >>> t3 = pysal.region.Random_Region(ids, num_regions=nregs, contiguity=w)
     >>> t3.regions[1]
-    [62, 52, 51, 63, 61, 73, 41, 53, 60, 83, 42, 31, 32]
+    [30, 50, 40, 20, 10, 60, 31, 91, 61, 81, 32, 70, 62, 80, 90, 71]
 
     Cardinality and contiguity constrained
 
-    >>> random.seed(60)
     >>> np.random.seed(60)
     >>> t4 = pysal.region.Random_Region(ids, cardinality=cards, contiguity=w)
     >>> t4.regions[0]
-    [62, 61, 81, 71, 64, 90, 72, 51, 80, 63, 50, 73, 52]
+    [37, 89, 58, 48, 68, 47, 69, 67, 98, 79, 57, 99, 66]
 
     Number of regions constrained
 
-    >>> random.seed(100)
     >>> np.random.seed(100)
     >>> t5 = pysal.region.Random_Region(ids, num_regions=nregs)
     >>> t5.regions[0]
-    [37, 62, 26, 41, 35, 25, 36]
+    [37, 62, 26, 41, 35]
 
     Cardinality constrained
 
-    >>> random.seed(100)
     >>> np.random.seed(100)
     >>> t6 = pysal.region.Random_Region(ids, cardinality=cards)
     >>> t6.regions[0]
@@ -279,20 +519,28 @@ class Random_Region:
 
     Contiguity constrained
 
-    >>> random.seed(100)
     >>> np.random.seed(100)
     >>> t7 = pysal.region.Random_Region(ids, contiguity=w)
     >>> t7.regions[0]
-    [37, 36, 38, 39]
+    [37, 36, 35, 34]
 
     """
     def __init__(
         self, area_ids, num_regions=None, cardinality=None, contiguity=None,
-                    maxiter=1000, compact=False, max_swaps=1000000):
+                    maxiter=1000, compact=False, max_swaps=1000000,
+                    seed=None, _csr=None):
 
         self.n = len(area_ids)
-        ids = copy.copy(area_ids)
-        self.ids = list(np.random.permutation(ids))
+        rng = _get_rng(seed)  # not kept, so instances stay picklable
+        self._aid_of = np.array(area_ids)  # a copy, area_ids is not modified
+        if contiguity:
+            # contiguity builds work on shuffled indices into area_ids
+            self._ids_arr = np.arange(self.n, dtype=np.int32)
+            rng.shuffle(self._ids_arr)
+        else:
+            # the other builds only split the shuffled ids
+            self._ids_arr = None
+            rng.shuffle(self._aid_of)
         self.area_ids = area_ids
         self.regions = []
         self.feasible = True
@@ -315,24 +563,24 @@ class Random_Region:
         if num_regions and cardinality and contiguity:
             # conditioning on cardinality and contiguity (number of regions implied)
             self.build_contig_regions(num_regions, cardinality, contiguity,
-                                      maxiter, compact, max_swaps)
+                                      maxiter, compact, max_swaps, _csr, rng)
         elif num_regions and cardinality:
             # conditioning on cardinality (number of regions implied)
             region_breaks = self.cards2breaks(cardinality)
             self.build_noncontig_regions(num_regions, region_breaks)
         elif num_regions and contiguity:
             # conditioning on number of regions and contiguity
-            cards = self.get_cards(num_regions)
+            cards = self.get_cards(num_regions, rng)
             self.build_contig_regions(num_regions, cards, contiguity,
-                                      maxiter, compact, max_swaps)
+                                      maxiter, compact, max_swaps, _csr, rng)
         elif cardinality and contiguity:
             # conditioning on cardinality and contiguity
             num_regions = len(cardinality)
             self.build_contig_regions(num_regions, cardinality, contiguity,
-                                      maxiter, compact, max_swaps)
+                                      maxiter, compact, max_swaps, _csr, rng)
         elif num_regions:
             # conditioning on number of regions only
-            region_breaks = self.get_region_breaks(num_regions)
+            region_breaks = self.get_region_breaks(num_regions, rng)
             self.build_noncontig_regions(num_regions, region_breaks)
         elif cardinality:
             # conditioning on number of cardinality only
@@ -341,59 +589,49 @@ class Random_Region:
             self.build_noncontig_regions(num_regions, region_breaks)
         elif contiguity:
             # conditioning on number of contiguity only
-            num_regions = self.get_num_regions()
-            cards = self.get_cards(num_regions)
+            num_regions = self.get_num_regions(rng)
+            cards = self.get_cards(num_regions, rng)
             self.build_contig_regions(num_regions, cards, contiguity,
-                                      maxiter, compact, max_swaps)
+                                      maxiter, compact, max_swaps, _csr, rng)
         else:
             # unconditioned
-            num_regions = self.get_num_regions()
-            region_breaks = self.get_region_breaks(num_regions)
+            num_regions = self.get_num_regions(rng)
+            region_breaks = self.get_region_breaks(num_regions, rng)
             self.build_noncontig_regions(num_regions, region_breaks)
 
-    def get_num_regions(self):
-        return np.random.random_integers(2, self.n)
-
-    def get_region_breaks(self, num_regions):
-        region_breaks = set([])
-        while len(region_breaks) < num_regions - 1:
-            region_breaks.add(np.random.random_integers(1, self.n - 1))
-        region_breaks = list(region_breaks)
-        region_breaks.sort()
-        return region_breaks
-
-    def get_cards(self, num_regions):
-        region_breaks = self.get_region_breaks(num_regions)
-        cards = []
-        start = 0
-        for i in region_breaks:
-            cards.append(i - start)
-            start = i
-        cards.append(self.n - start)
-        return cards
+    @property
+    def ids(self):
+        """Shuffled area ids."""
+        if self._ids_arr is None:
+            return self._aid_of.tolist()
+        return self._aid_of[self._ids_arr].tolist()
+
+    def get_num_regions(self, rng=np.random):
+        return rng.randint(2, self.n + 1)
+
+    def get_region_breaks(self, num_regions, rng=np.random):
+        region_breaks = rng.choice(self.n - 1, size=num_regions - 1,
+                                   replace=False)
+        return (np.sort(region_breaks) + 1).tolist()
+
+    def get_cards(self, num_regions, rng=np.random):
+        region_breaks = self.get_region_breaks(num_regions, rng)
+        return np.diff([0] + region_breaks + [self.n]).tolist()
 
     def cards2breaks(self, cards):
-        region_breaks = []
-        break_point = 0
-        for i in cards:
-            break_point += i
-            region_breaks.append(break_point)
-        region_breaks.pop()
-        return region_breaks
+        return np.cumsum(cards)[:-1].tolist()
 
     def build_noncontig_regions(self, num_regions, region_breaks):
-        start = 0
-        for i in region_breaks:
-            self.regions.append(self.ids[start:i])
-            start = i
-        self.regions.append(self.ids[start:])
+        self.regions = [region.tolist()
+                        for region in np.split(self._aid_of, region_breaks)]
 
     def grow_compact(self, w, test_card, region, candidates, potential):
         # try to build a compact region by exhausting all existing
-        # potential areas before adding new potential areas
+        # potential areas before adding new potential areas (draws from the
+        # global numpy state, ignoring seed; not used by the builder)
         add_areas = []
         while potential and len(region) < test_card:
-            pot_index = np.random.random_integers(0, len(potential) - 1)
+            pot_index = np.random.randint(len(potential))
             add_area = potential[pot_index]
             region.append(add_area)
             candidates.remove(add_area)
@@ -408,8 +646,9 @@ class Random_Region:
 
     def grow_free(self, w, test_card, region, candidates, potential):
         # increment potential areas after each new area is
-        # added to the region (faster than the grow_compact)
-        pot_index = np.random.random_integers(0, len(potential) - 1)
+        # added to the region (faster than the grow_compact; draws from the
+        # global numpy state, ignoring seed; not used by the builder)
+        pot_index = np.random.randint(len(potential))
         add_area = potential[pot_index]
         region.append(add_area)
         candidates.remove(add_area)
@@ -421,11 +660,30 @@ class Random_Region:
         return region, candidates, potential
 
     def build_contig_regions(self, num_regions, cardinality, w,
-                                maxiter, compact, max_swaps):
-        if compact:
-            grow_region = self.grow_compact
-        else:
-            grow_region = self.grow_free
+                                maxiter, compact, max_swaps, csr=None,
+                                rng=np.random):
+        # regions are built on area indices following w.id_order (which
+        # matches area_ids) and mapped back to area ids at the end
+        ids = self.area_ids
+        if csr is None:
+            csr = _w_to_csr(w)
+        indptr, data, comp_sizes = csr
+        state, pot_items, region_buf = _workspace(self.n)
+        # try to build largest regions first (pop from end of list)
+        cards_sorted = sorted(cardinality)
+        # uniform draws for the growing kernel, refilled in batches of n
+        draws = []
+        d = 0
+        if (cards_sorted[-1] > comp_sizes.max() or
+                cards_sorted[0] > comp_sizes.min() or
+                len(comp_sizes) > len(cards_sorted)):
+            # every connected component must be exactly covered by regions:
+            # if the largest region fits in no component, some component is
+            # smaller than the smallest region, or there are more components
+            # than regions, no attempt (nor swapping) can succeed
+            self.feasible = False
+            self.regions = []
+            return
         iter = 0
         while iter < maxiter:
 
@@ -433,12 +691,12 @@ class Random_Region:
             regions = []
             size_pre = 0
             counter = -1
-            area2region = {}
+            area2region = [-1] * self.n
             self.feasible = False
             swap_count = 0
-            cards = copy.copy(cardinality)
-            cards.sort()  # try to build largest regions first (pop from end of list)
-            candidates = copy.copy(self.ids)  # these are already shuffled
+            cards = cards_sorted[:]
+            # these are already shuffled
+            candidates = _Candidates(self._ids_arr.tolist(), state)
 
             # begin building regions
             while candidates and swap_count < max_swaps:
@@ -456,20 +714,25 @@ class Random_Region:
                     swap_in = None   # area to become new candidate
                     while swap_in is None:  # PEP8 E711
                         swap_count += 1
-                        swap_out = candidates.pop(0)  # area to remove from candidates
-                        swap_neighs = copy.copy(w.neighbors[swap_out])
-                        swap_neighs = list(np.random.permutation(swap_neighs))
+                        swap_out = candidates.popleft()  # area to remove from candidates
+                        swap_neighs = data[indptr[swap_out]:indptr[swap_out + 1]]
+                        swap_neighs = rng.permutation(swap_neighs).tolist()
                         # select area to add to candidates (i.e. remove from an existing region)
                         for i in swap_neighs:
                             if i not in candidates:
                                 join = i  # area linking swap_in to swap_out
                                 swap_index = area2region[join]
                                 swap_region = regions[swap_index]
-                                swap_region = list(np.random.permutation(swap_region))
+                                swap_region = rng.permutation(swap_region).tolist()
+                                swap_region_test = swap_region + [swap_out]
+                                if HAS_JIT:
+                                    swap_region_test = np.array(
+                                        swap_region_test, dtype=np.int32)
                                 for j in swap_region:
                                     # test to ensure region connectivity after removing area
-                                    swap_region_test = swap_region[:] + [swap_out]
-                                    if check_contiguity(w, swap_region_test, j):
+                                    if _check_contiguity(indptr, data,
+                                                         swap_region_test, j,
+                                                         state, pot_items):
                                         swap_in = j
                                         break
                             if swap_in is not None:  # PEP8 E711
@@ -479,35 +742,37 @@ class Random_Region:
                     # swapping cleanup
                     regions[swap_index].remove(swap_in)
                     regions[swap_index].append(swap_out)
-                    area2region.pop(swap_in)
+                    area2region[swap_in] = -1
                     area2region[swap_out] = swap_index
                     candidates.append(swap_in)
                     counter = 0
 
-                # setup to build a single region
-                building = True
-                seed = candidates.pop(0)
-                region = [seed]
-                potential = [i for i in w.neighbors[seed] if i in candidates]
+                # build a single region
+                seed = candidates.popleft()
                 test_card = cards.pop()
-
-                # begin building single region
-                while building and len(region) < test_card:
-                    if potential:
-                        region, candidates, potential = grow_region(
-                            w, test_card,
-                                        region, candidates, potential)
+                if len(draws) - d < test_card - 1:
+                    draws = rng.random_sample(max(self.n, test_card))
+                    if not HAS_JIT:
+                        draws = draws.tolist()
+                    d = 0
+                size = _grow_region(indptr, data, seed, test_card, compact,
+                                    state, pot_items, region_buf, draws, d)
+                d += size - 1
+                region = region_buf[:size]  # a copy for lists
+                if HAS_JIT:
+                    region = region.tolist()
+                for i in region[1:]:
+                    candidates.remove(i)
+                if size < test_card:
+                    # not enough potential neighbors to reach test_card size
+                    cards.append(test_card)
+                    if size in cards:
+                        # constructed region matches another candidate region size
+                        cards.remove(size)
                     else:
-                        # not enough potential neighbors to reach test_card size
-                        building = False
-                        cards.append(test_card)
-                        if len(region) in cards:
-                            # constructed region matches another candidate region size
-                            cards.remove(len(region))
-                        else:
-                            # constructed region doesn't match a candidate region size
-                            candidates.extend(region)
-                            region = []
+                        # constructed region doesn't match a candidate region size
+                        candidates.extend(region)
+                        region = []
 
                 # cleanup when successful region built
                 if region:
@@ -518,12 +783,11 @@ class Random_Region:
             # handling of regionalization result
             if len(regions) < num_regions:
                 # regionalization failed
-                self.ids = list(np.random.permutation(self.ids))
+                rng.shuffle(self._ids_arr)
                 regions = []
                 iter += 1
             else:
                 # regionalization successful
                 self.feasible = True
                 iter = maxiter
-        self.regions = regions
-
+        self.regions = [[ids[i] for i in region] for region in regions]
@@ -2,8 +2,10 @@
 import unittest
 import pysal
 from pysal.region.components import is_component
+from pysal.region import randomregion
 import numpy as np
-import random
+import copy
+import pickle
 
 
 class Test_Random_Regions(unittest.TestCase):
@@ -14,20 +16,18 @@ class Test_Random_Regions(unittest.TestCase):
         self.ids = self.w.id_order
 
     def test_Random_Regions(self):
-        random.seed(10)
         np.random.seed(10)
         t0 = pysal.region.Random_Regions(self.ids, permutations=2)
-        result = [19, 14, 43, 37, 66, 3, 79, 41, 38, 68, 2, 1, 60]
+        result = [19, 14, 43, 37, 66, 3]
         for i in range(len(result)):
             self.assertEquals(t0.solutions[0].regions[0][i], result[i])
         for i in range(len(t0.solutions)):
             self.assertEquals(t0.solutions_feas[i], t0.solutions[i])
 
-        random.seed(60)
         np.random.seed(60)
         t0 = pysal.region.Random_Regions(self.ids, num_regions=self.nregs,
                                          cardinality=self.cards, contiguity=self.w, permutations=2)
-        result = [88, 97, 98, 89, 99, 86, 77, 68, 79, 78, 59, 49, 69]
+        result = [88, 85, 57, 66, 97, 99, 89, 96, 77, 79, 78, 87, 98]
         for i in range(len(result)):
             self.assertEquals(t0.solutions[0].regions[0][i], result[i])
         for i in range(len(t0.solutions)):
@@ -36,7 +36,6 @@ class Test_Random_Regions(unittest.TestCase):
             for region in solution.regions:
                 self.assertTrue(is_component(self.w, region))
 
-        random.seed(100)
         np.random.seed(100)
         t0 = pysal.region.Random_Regions(self.ids, num_regions=self.nregs,
                                          cardinality=self.cards, permutations=2)
@@ -46,11 +45,10 @@ class Test_Random_Regions(unittest.TestCase):
         for i in range(len(t0.solutions)):
             self.assertEquals(t0.solutions_feas[i], t0.solutions[i])
 
-        random.seed(100)
         np.random.seed(100)
         t0 = pysal.region.Random_Regions(self.ids,
                                          num_regions=self.nregs, contiguity=self.w, permutations=2)
-        result = [73, 83, 94, 95, 64, 92, 70, 82, 81, 60, 74, 93, 71]
+        result = [83, 74, 90, 72, 93, 85, 96, 82, 71, 91, 92, 81, 75, 66, 84, 80]
         for i in range(len(result)):
             self.assertEquals(t0.solutions[0].regions[1][i], result[i])
         for i in range(len(t0.solutions)):
@@ -59,11 +57,10 @@ class Test_Random_Regions(unittest.TestCase):
             for region in solution.regions:
                 self.assertTrue(is_component(self.w, region))
 
-        random.seed(60)
         np.random.seed(60)
         t0 = pysal.region.Random_Regions(self.ids,
                                          cardinality=self.cards, contiguity=self.w, permutations=2)
-        result = [88, 97, 98, 89, 99, 86, 77, 68, 79, 78, 59, 49, 69]
+        result = [88, 85, 57, 66, 97, 99, 89, 96, 77, 79, 78, 87, 98]
         for i in range(len(result)):
             self.assertEquals(t0.solutions[0].regions[0][i], result[i])
         for i in range(len(t0.solutions)):
@@ -72,17 +69,15 @@ class Test_Random_Regions(unittest.TestCase):
             for region in solution.regions:
                 self.assertTrue(is_component(self.w, region))
 
-        random.seed(100)
         np.random.seed(100)
         t0 = pysal.region.Random_Regions(
             self.ids, num_regions=self.nregs, permutations=2)
-        result = [37, 62, 26, 41, 35, 25, 36]
+        result = [37, 62, 26, 41, 35]
         for i in range(len(result)):
             self.assertEquals(t0.solutions[0].regions[0][i], result[i])
         for i in range(len(t0.solutions)):
             self.assertEquals(t0.solutions_feas[i], t0.solutions[i])
 
-        random.seed(100)
         np.random.seed(100)
         t0 = pysal.region.Random_Regions(
             self.ids, cardinality=self.cards, permutations=2)
@@ -92,11 +87,10 @@ class Test_Random_Regions(unittest.TestCase):
         for i in range(len(t0.solutions)):
             self.assertEquals(t0.solutions_feas[i], t0.solutions[i])
 
-        random.seed(100)
         np.random.seed(100)
         t0 = pysal.region.Random_Regions(
             self.ids, contiguity=self.w, permutations=2)
-        result = [62, 52, 51, 50]
+        result = [62, 53, 64, 75]
         for i in range(len(result)):
             self.assertEquals(t0.solutions[0].regions[1][i], result[i])
         for i in range(len(t0.solutions)):
@@ -105,29 +99,163 @@ class Test_Random_Regions(unittest.TestCase):
             for region in solution.regions:
                 self.assertTrue(is_component(self.w, region))
 
+    def test_Random_Regions_cores(self):
+        np.random.seed(10)
+        t0 = pysal.region.Random_Regions(self.ids, cardinality=self.cards,
+                                         contiguity=self.w, permutations=8,
+                                         cores=True)
+        np.random.seed(10)
+        t1 = pysal.region.Random_Regions(self.ids, cardinality=self.cards,
+                                         contiguity=self.w, permutations=8,
+                                         cores=True)
+        self.assertEquals(len(t0.solutions), 8)
+        for s0, s1 in zip(t0.solutions, t1.solutions):
+            self.assertEquals(s0.regions, s1.regions)
+            for region in s0.regions:
+                self.assertTrue(is_component(self.w, region))
+
+    def test_Random_Regions_seed(self):
+        t0 = pysal.region.Random_Regions(self.ids, cardinality=self.cards,
+                                         contiguity=self.w, permutations=8,
+                                         seed=10)
+        t1 = pysal.region.Random_Regions(self.ids, cardinality=self.cards,
+                                         contiguity=self.w, permutations=8,
+                                         cores=True, seed=10)
+        for s0, s1 in zip(t0.solutions, t1.solutions):
+            self.assertEquals(s0.regions, s1.regions)
+
+    def test_Random_Regions_pickle(self):
+        t0 = pysal.region.Random_Regions(self.ids, contiguity=self.w,
+                                         permutations=2)
+        t1 = pickle.loads(pickle.dumps(t0))
+        for s0, s1 in zip(t0.solutions, t1.solutions):
+            self.assertEquals(s0.regions, s1.regions)
+        t2 = copy.deepcopy(t0.solutions[0])
+        self.assertEquals(t2.regions, t0.solutions[0].regions)
+
+    def test_grow_region(self):
+        np.random.seed(10)
+        t0 = pysal.region.Random_Region(self.ids)
+        for grow in (t0.grow_compact, t0.grow_free):
+            candidates = self.ids[1:]
+            region, candidates, potential = grow(self.w, 5, [0], candidates,
+                                                 self.w.neighbors[0][:])
+            self.assertTrue(is_component(self.w, region))
+            self.assertEquals(len(candidates), 99 - len(region) + 1)
+            for i in potential:
+                self.assertTrue(i in candidates and i not in region)
+
+    def test_Candidates_uint8(self):
+        # the state array used with numba
+        state = np.zeros(4, dtype=np.uint8)
+        candidates = randomregion._Candidates([2, 0, 3, 1], state)
+        self.assertEquals(candidates.popleft(), 2)
+        candidates.remove(3)
+        self.assertEquals(len(candidates), 2)
+        self.assertEquals(state.tolist(), [1, 1, 0, 0])
+
+    def test_kernels_uint8(self):
+        # the kernels run uncompiled on the state array used with numba, as
+        # with NUMBA_DISABLE_JIT=1
+        grow = getattr(randomregion._grow_region, 'py_func',
+                       randomregion._grow_region)
+        check = getattr(randomregion._check_contiguity, 'py_func',
+                        randomregion._check_contiguity)
+        w = pysal.lat2W(4, 4)
+        csr = randomregion._w_to_csr(w)
+        indptr, data = csr[0], csr[1]
+        state = np.ones(16, dtype=np.uint8)
+        state[0] = 0
+        pot_items = np.zeros(16, dtype=np.int32)
+        region = np.zeros(16, dtype=np.int32)
+        draws = np.linspace(0, 0.9, 16)
+        for compact in (False, True):
+            size = grow(indptr, data, 0, 5, compact, state, pot_items,
+                        region, draws, 0)
+            self.assertEquals(size, 5)
+            members = region[:size].tolist()
+            self.assertTrue(is_component(w, members))
+            self.assertEquals(state.tolist(),
+                              [int(i not in members) for i in range(16)])
+            state[:] = 1
+            state[0] = 0
+        state[:] = 0
+        members = np.array([0, 1, 2], dtype=np.int32)
+        self.assertEquals(check(indptr, data, members, 1, state, pot_items),
+                          False)
+        self.assertEquals(check(indptr, data, members, 2, state, pot_items),
+                          True)
+        self.assertEquals(state.tolist(), [0] * 16)
+
+    @unittest.skipIf(not randomregion.HAS_JIT, "numba not installed")
+    def test_Random_Region_jit(self):
+        t0 = pysal.region.Random_Region(self.ids, cardinality=self.cards,
+                                        contiguity=self.w, seed=10)
+        self.assertEquals(t0.feasible, True)
+        self.assertEquals(sorted(sum(t0.regions, [])), sorted(self.ids))
+        for region in t0.regions:
+            self.assertTrue(is_component(self.w, region))
+
+    def test_Random_Region_infeasible(self):
+        # two disconnected halves of a 4x4 lattice
+        w = pysal.lat2W(4, 4)
+        neighbors = dict((i, [j for j in w.neighbors[i] if (j < 8) == (i < 8)])
+                         for i in w.id_order)
+        w = pysal.W(neighbors)
+        np.random.seed(10)
+        t0 = pysal.region.Random_Region(w.id_order, cardinality=[10, 6],
+                                        contiguity=w)
+        self.assertEquals(t0.feasible, False)
+        self.assertEquals(t0.regions, [])
+        # an island smaller than the smallest region
+        w = pysal.lat2W(4, 4)
+        neighbors = dict((i, [j for j in w.neighbors[i] if 15 not in (i, j)])
+                         for i in w.id_order)
+        w = pysal.W(neighbors)
+        t1 = pysal.region.Random_Region(w.id_order, cardinality=[8, 8],
+                                        contiguity=w)
+        self.assertEquals(t1.feasible, False)
+        # components of sizes 2, 2, 2 and 8: more components than regions
+        neighbors = {0: [1], 1: [0], 2: [3], 3: [2], 4: [5], 5: [4]}
+        for i in range(6, 14):
+            neighbors[i] = [j for j in (i - 1, i + 1) if 6 <= j < 14]
+        w = pysal.W(neighbors)
+        t2 = pysal.region.Random_Region(w.id_order, cardinality=[2, 6, 6],
+                                        contiguity=w)
+        self.assertEquals(t2.feasible, False)
+        self.assertEquals(t2.regions, [])
+
+    def test_Random_Region_seed(self):
+        np.random.seed(10)
+        t0 = pysal.region.Random_Region(self.ids, num_regions=self.nregs,
+                                        contiguity=self.w, seed=100)
+        np.random.seed(20)
+        t1 = pysal.region.Random_Region(self.ids, num_regions=self.nregs,
+                                        contiguity=self.w, seed=100)
+        self.assertEquals(t0.regions, t1.regions)
+        for region in t0.regions:
+            self.assertTrue(is_component(self.w, region))
+
     def test_Random_Region(self):
-        random.seed(10)
         np.random.seed(10)
         t0 = pysal.region.Random_Region(self.ids)
         t0.regions[0]
-        result = [19, 14, 43, 37, 66, 3, 79, 41, 38, 68, 2, 1, 60]
+        result = [19, 14, 43, 37, 66, 3]
         for i in range(len(result)):
             self.assertEquals(t0.regions[0][i], result[i])
         self.assertEquals(t0.feasible, True)
 
-        random.seed(60)
         np.random.seed(60)
         t0 = pysal.region.Random_Region(self.ids, num_regions=self.nregs,
                                         cardinality=self.cards, contiguity=self.w)
         t0.regions[0]
-        result = [88, 97, 98, 89, 99, 86, 77, 68, 79, 78, 59, 49, 69]
+        result = [88, 85, 57, 66, 97, 99, 89, 96, 77, 79, 78, 87, 98]
         for i in range(len(result)):
             self.assertEquals(t0.regions[0][i], result[i])
         self.assertEquals(t0.feasible, True)
         for region in t0.regions:
             self.assertTrue(is_component(self.w, region))
 
-        random.seed(100)
         np.random.seed(100)
         t0 = pysal.region.Random_Region(
             self.ids, num_regions=self.nregs, cardinality=self.cards)
@@ -137,40 +265,36 @@ class Test_Random_Regions(unittest.TestCase):
             self.assertEquals(t0.regions[0][i], result[i])
         self.assertEquals(t0.feasible, True)
 
-        random.seed(100)
         np.random.seed(100)
         t0 = pysal.region.Random_Region(
             self.ids, num_regions=self.nregs, contiguity=self.w)
         t0.regions[1]
-        result = [73, 83, 94, 95, 64, 92, 70, 82, 81, 60, 74, 93, 71]
+        result = [83, 74, 90, 72, 93, 85, 96, 82, 71, 91, 92, 81, 75, 66, 84, 80]
         for i in range(len(result)):
             self.assertEquals(t0.regions[1][i], result[i])
         self.assertEquals(t0.feasible, True)
         for region in t0.regions:
             self.assertTrue(is_component(self.w, region))
 
-        random.seed(60)
         np.random.seed(60)
         t0 = pysal.region.Random_Region(
             self.ids, cardinality=self.cards, contiguity=self.w)
         t0.regions[0]
-        result = [88, 97, 98, 89, 99, 86, 77, 68, 79, 78, 59, 49, 69]
+        result = [88, 85, 57, 66, 97, 99, 89, 96, 77, 79, 78, 87, 98]
         for i in range(len(result)):
             self.assertEquals(t0.regions[0][i], result[i])
         self.assertEquals(t0.feasible, True)
         for region in t0.regions:
             self.assertTrue(is_component(self.w, region))
 
-        random.seed(100)
         np.random.seed(100)
         t0 = pysal.region.Random_Region(self.ids, num_regions=self.nregs)
         t0.regions[0]
-        result = [37, 62, 26, 41, 35, 25, 36]
+        result = [37, 62, 26, 41, 35]
         for i in range(len(result)):
             self.assertEquals(t0.regions[0][i], result[i])
         self.assertEquals(t0.feasible, True)
 
-        random.seed(100)
         np.random.seed(100)
         t0 = pysal.region.Random_Region(self.ids, cardinality=self.cards)
         t0.regions[0]
@@ -179,11 +303,10 @@ class Test_Random_Regions(unittest.TestCase):
             self.assertEquals(t0.regions[0][i], result[i])
         self.assertEquals(t0.feasible, True)
 
-        random.seed(100)
         np.random.seed(100)
         t0 = pysal.region.Random_Region(self.ids, contiguity=self.w)
         t0.regions[0]
-        result = [37, 27, 36, 17]
+        result = [37, 36, 25, 16]
         for i in range(len(result)):
             self.assertEquals(t0.regions[0][i], result[i])
         self.assertEquals(t0.feasible, True)